@@ -1,15 +1,32 @@
 import os
 import json
+import shutil
+import hashlib
+import math
+import bisect
+import functools
+import threading
+import struct
+import time
 import requests
+import orjson
 from pathlib import Path
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, request, send_from_directory, abort
 from flask_cors import CORS
 import numpy as np
 
 # --- Auto-download model from Google Drive ---
 MODEL_URL = os.environ.get("MODEL_URL")  # set in Render env
+MODEL_SHA256 = os.environ.get("MODEL_SHA256")  # optional integrity check
 MODEL_PATH = Path("leukemia_model.h5")
 
+def _file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
 def ensure_model_downloaded():
     """Download model from MODEL_URL if not present."""
     if MODEL_PATH.exists():
@@ -20,12 +37,17 @@ def ensure_model_downloaded():
         return False
     try:
         print("📥 Downloading model from:", MODEL_URL)
-        r = requests.get(MODEL_URL, stream=True, timeout=120)
-        r.raise_for_status()
-        with open(MODEL_PATH, "wb") as f:
-            for chunk in r.iter_content(chunk_size=8192):
-                if chunk:
-                    f.write(chunk)
+        tmp = MODEL_PATH.with_suffix(".part")
+        with requests.get(MODEL_URL, stream=True, timeout=120) as r:
+            r.raise_for_status()
+            r.raw.decode_content = True
+            with open(tmp, "wb") as f:
+                shutil.copyfileobj(r.raw, f, length=1 << 20)
+        if MODEL_SHA256:
+            if _file_sha256(tmp) != MODEL_SHA256.lower():
+                tmp.unlink()
+                raise ValueError("SHA256 mismatch for downloaded model")
+        tmp.replace(MODEL_PATH)
         print("✅ Model downloaded:", MODEL_PATH)
         return True
     except Exception as e:
@@ -36,95 +58,390 @@ def ensure_model_downloaded():
 ensure_model_downloaded()
 
 # --- TensorFlow model loading ---
+TFLITE_PATH = Path("leukemia_model.tflite")  # built by convert_tflite.py
+TFLITE_CHUNK = 64  # rows per batch-interpreter call; larger batches run in chunks
 TF_OK = True
 MODEL = None
 MODEL_ERR = None
+MODEL_KIND = None
+MODEL_TAG = None  # short content hash of the loaded model file (shared-cache namespace)
+INFER = None  # float32 (n, 7) ndarray -> (n, 1) ndarray, bypasses model.predict()
+_load_lock = threading.Lock()
+
+def _load_tflite():
+    """int8 TFLite model via tflite_runtime, or None if either is missing."""
+    if not TFLITE_PATH.exists():
+        return None
+    try:
+        from tflite_runtime.interpreter import Interpreter
+    except ImportError as e:
+        print(f"⚠️ {TFLITE_PATH} found but tflite_runtime is unavailable ({e}); using TensorFlow.")
+        return None
+
+    def interpreter(rows):
+        # fixed input shape per interpreter, so requests never resize/reallocate
+        itp = Interpreter(model_path=str(TFLITE_PATH))
+        in_i = itp.get_input_details()[0]["index"]
+        itp.resize_tensor_input(in_i, [rows, len(_FIELDS)])
+        itp.allocate_tensors()
+        lock = threading.Lock()  # an interpreter is not thread-safe
+        return itp, in_i, itp.get_output_details()[0]["index"], lock
+
+    single, batch = interpreter(1), interpreter(TFLITE_CHUNK)
+    pad = np.zeros((TFLITE_CHUNK, len(_FIELDS)), dtype=np.float32)  # guarded by batch's lock
+
+    def infer(x):
+        if len(x) == 1:
+            itp, in_i, out_i, lock = single
+            with lock:
+                itp.set_tensor(in_i, x)
+                itp.invoke()
+                return itp.get_tensor(out_i)
+        itp, in_i, out_i, lock = batch
+        out = np.empty((len(x), 1), dtype=np.float32)
+        with lock:
+            for start in range(0, len(x), TFLITE_CHUNK):
+                n = min(TFLITE_CHUNK, len(x) - start)
+                pad[:n] = x[start:start + n]
+                pad[n:] = 0.0
+                itp.set_tensor(in_i, pad)
+                itp.invoke()
+                out[start:start + n] = itp.get_tensor(out_i)[:n]
+        return out
+
+    return single[0], infer
+
+def _load_keras():
+    if not MODEL_PATH.exists():  # don't pay for the TF import just to fail
+        raise FileNotFoundError(f"{MODEL_PATH} not found")
+    os.environ.setdefault("TF_CPP_MIN_LOG_LEVEL", "3")
+    import tensorflow as tf
+    tf.config.optimizer.set_jit(True)  # XLA for the small MLP
+    model = tf.keras.models.load_model(MODEL_PATH, compile=False)
+
+    @tf.function(input_signature=[tf.TensorSpec([None, len(_FIELDS)], tf.float32)])
+    def infer(x):
+        return model(x, training=False)
+
+    infer(tf.zeros([1, len(_FIELDS)]))  # trace once so requests reuse the graph
+    return model, lambda x: infer(x).numpy()
 
 def try_load_model():
-    """Try loading TensorFlow model safely."""
-    global MODEL, MODEL_ERR, TF_OK
+    """Try loading the TFLite model, then the TensorFlow one, safely."""
+    global MODEL, MODEL_ERR, MODEL_KIND, MODEL_TAG, TF_OK, INFER
     if MODEL is not None or MODEL_ERR is not None:
         return MODEL
+    with _load_lock:  # first requests may race; load (and import TF) only once
+        if MODEL is not None or MODEL_ERR is not None:
+            return MODEL
+        try:
+            loaded = _load_tflite()
+        except Exception as e:  # corrupt file / unsupported op: the .h5 may still work
+            loaded = None
+            print("⚠️ TFLite model load failed, trying TensorFlow:", e)
+        try:
+            if loaded is not None:
+                MODEL_KIND, path = "tflite-int8", TFLITE_PATH
+            else:
+                loaded = _load_keras()
+                MODEL_KIND, path = "tf-keras", MODEL_PATH
+            MODEL_TAG = _file_sha256(path)[:16]
+            INFER = loaded[1]
+            MODEL = loaded[0]  # set last: other threads check MODEL without the lock
+            print(f"✅ {MODEL_KIND} model loaded successfully!")
+            return MODEL
+        except Exception as e:
+            TF_OK = False
+            MODEL_ERR = str(e)
+            print("⚠️ TensorFlow model load failed:", e)
+            return None
+
+# --- request parsing ---
+# Model input order; numbers default like the form, flags are "Yes"/"No".
+_FIELDS = ("age", "pulse", "fever", "temp_c", "pallor", "bruises", "weight_loss")
+_DEFAULTS = (8, 80, "No", 37, "No", "No", "No")
+_FLAGS = frozenset({"fever", "pallor", "bruises", "weight_loss"})
+
+_YES = frozenset({"yes", "y", "1", "true", "t", "haan", "ha", "h"})
+
+def _yes(v):
+    if isinstance(v, (bool, int, float)):  # JSON true/1 skip the string round-trip
+        return v == 1
+    return str(v).strip().lower() in _YES
+
+def _num(v):
     try:
-        import tensorflow as tf
-        MODEL = tf.keras.models.load_model("leukemia_model.h5", compile=False)
-        print("✅ TF model loaded successfully!")
-        return MODEL
-    except Exception as e:
-        TF_OK = False
-        MODEL_ERR = str(e)
-        print("⚠️ TensorFlow model load failed:", e)
-        return None
+        return float(v)
+    except (TypeError, ValueError, OverflowError):
+        return math.nan
+
+def _compile_builder():
+    """Generate _build_x(d, out): one unrolled line per field, helpers bound as locals."""
+    lines = ["def _build_x(d, out, _yes=_yes, _num=_num):"]
+    for i, (k, default) in enumerate(zip(_FIELDS, _DEFAULTS)):
+        conv = "_yes" if k in _FLAGS else "_num"
+        lines.append(f"    out[{i}] = {conv}(d.get({k!r}, {default!r}))")
+    ns = {"_yes": _yes, "_num": _num}
+    exec("\n".join(lines), ns)
+    return ns["_build_x"]
+
+_build_x = _compile_builder()
+
+def parse_features(data, out=None):
+    """Read all fields into out (or a new float32 vector); NaN marks a missing/unparseable number."""
+    x = np.empty(len(_FIELDS), dtype=np.float32) if out is None else out
+    _build_x(data, x)
+    return x
+
+def model_ready(data, x):
+    """Model path needs numeric age/pulse and a numeric or empty temp (empty -> 0)."""
+    return bool(np.isfinite(x[:2]).all()) and (x[3] == x[3] or not data.get("temp_c", 37))
+
+def clamp01(p):
+    return 0.0 if p < 0.0 else 1.0 if p > 1.0 else p
 
 # --- fallback heuristic if model fails ---
-def fallback_score(features):
-    """Rudimentary heuristic model."""
+# Severity step tables: level i applies from edge i-1 (inclusive) up to edge i.
+# Tuples serve single values (bisect); the arrays serve whole batches (searchsorted).
+_PULSE_CUTS = (100.0,)
+_PULSE_EDGES = np.array(_PULSE_CUTS)
+_PULSE_SEV = np.array([0.0, 1.0])
+_TEMP_CUTS = (38.0,)
+_TEMP_EDGES = np.array(_TEMP_CUTS)
+_TEMP_SEV = np.array([0.0, 1.0])
+# One weight per heuristic component; the score is components @ _W.
+_NAMES = ("fever", "pallor", "bruises", "weight_loss", "pulse", "temp_c")
+_W = np.array([0.25, 0.25, 0.20, 0.15, 0.10, 0.10])
+
+def _level(cuts, v):
+    """Step-table index for v (bisect_right == searchsorted side="right"); NaN is level 0."""
+    return 0 if v != v else bisect.bisect_right(cuts, v)
+
+@functools.lru_cache(maxsize=64)  # 2**4 flag combos x 2 pulse x 2 temp levels
+def _score(fever, pallor, bruises, weight_loss, pulse_level, temp_level):
+    """Scalar form of components @ _W, cached on the flags and pulse/temp step levels."""
     score = 0.0
-    if str(features.get("fever", "No")).lower() == "yes": score += 0.25
-    if str(features.get("pallor", "No")).lower() == "yes": score += 0.25
-    if str(features.get("bruises", "No")).lower() == "yes": score += 0.20
-    if str(features.get("weight_loss", "No")).lower() == "yes": score += 0.15
+    if fever: score += _W[0]
+    if pallor: score += _W[1]
+    if bruises: score += _W[2]
+    if weight_loss: score += _W[3]
+    score += _W[4] * _PULSE_SEV[pulse_level]
+    score += _W[5] * _TEMP_SEV[temp_level]
+    return min(1.0, max(0.0, score))
+
+def fallback_score(x):
+    """Rudimentary heuristic model on a parse_features() vector."""
+    age, pulse, fever, temp_c, pallor, bruises, weight_loss = x.tolist()
+    return _score(
+        bool(fever), bool(pallor), bool(bruises), bool(weight_loss),
+        _level(_PULSE_CUTS, pulse), _level(_TEMP_CUTS, temp_c),
+    )
+
+def _components(X):
+    """(n, 7) parse_features() rows -> (n, 6) heuristic components aligned with _W."""
+    pulse, temp_c = X[:, 1], X[:, 3]
+    C = np.empty((len(X), len(_W)))
+    C[:, :4] = X[:, [2, 4, 5, 6]]
+    C[:, 4] = np.where(np.isnan(pulse), 0.0, _PULSE_SEV[np.searchsorted(_PULSE_EDGES, pulse, side="right")])
+    C[:, 5] = np.where(np.isnan(temp_c), 0.0, _TEMP_SEV[np.searchsorted(_TEMP_EDGES, temp_c, side="right")])
+    return C
+
+def score_rows(X):
+    """Vectorized heuristic over an (n, 7) stack of parse_features() rows."""
+    return np.clip(_components(X) @ _W, 0.0, 1.0)
+
+def heuristic_details(x):
+    """Weighted contribution of each heuristic component for one row."""
+    return dict(zip(_NAMES, (_components(x[None, :])[0] * _W).tolist()))
+
+_TLS = threading.local()
+
+def _vectorize(features):
+    """Write features into this thread's reusable (1, 7) float32 buffer."""
+    buf = getattr(_TLS, "buf", None)
+    if buf is None:
+        buf = _TLS.buf = np.empty((1, 7), dtype=np.float32)
+    buf[0] = features
+    return buf
+
+# --- shared (cross-process) prediction cache ---
+REDIS_URL = os.environ.get("REDIS_URL")
+REDIS_TTL = 3600
+REDIS_BACKOFF = 5.0  # seconds to skip Redis after an error, so misses don't wait on timeouts
+_REDIS = None
+_redis_retry_at = 0.0
+if REDIS_URL:
     try:
-        pulse = float(features.get("pulse", 80))
-        if pulse >= 100: score += 0.10
-    except: pass
+        import redis
+        _REDIS = redis.Redis.from_url(REDIS_URL, socket_timeout=0.05)
+    except (ImportError, ValueError) as e:
+        _REDIS = None
+        print("⚠️ Redis unavailable, shared cache disabled:", e)
+
+def _shared_cached(prefix, key, compute):
+    """Look up/store compute() in Redis; any Redis failure just falls through to compute()."""
+    global _redis_retry_at
+    if _REDIS is None or time.monotonic() < _redis_retry_at:
+        return compute()
+    if isinstance(key, int):
+        rkey = prefix + struct.pack("<Q", key)
+    else:
+        rkey = prefix + struct.pack(f"<{len(key)}f", *key)
     try:
-        temp = float(features.get("temp_c", 37))
-        if temp >= 38: score += 0.10
-    except: pass
-    return min(1.0, max(0.0, score))
+        hit = _REDIS.get(rkey)
+        if hit is not None:
+            value = orjson.loads(hit)
+            if isinstance(value, float):
+                return value
+    except orjson.JSONDecodeError:
+        pass  # corrupt entry: recompute and overwrite it below
+    except redis.RedisError:
+        _redis_retry_at = time.monotonic() + REDIS_BACKOFF
+        return compute()
+    value = compute()
+    try:
+        _REDIS.setex(rkey, REDIS_TTL, orjson.dumps(value, option=orjson.OPT_SERIALIZE_NUMPY))
+    except redis.RedisError:
+        _redis_retry_at = time.monotonic() + REDIS_BACKOFF
+    return value
+
+# Packed key layout: age (7 bits) | pulse (9) | temp_c*2 (8) | 4 flag bits.
+# Only exact values are packed: integer age/pulse and temps on a whole/half degree.
+def _pack_key(features):
+    """Losslessly pack a model feature tuple into one int; the tuple itself if it doesn't fit."""
+    age, pulse, fever, temp_c, pallor, bruises, weight_loss = features
+    t2 = temp_c * 2
+    if not (age.is_integer() and pulse.is_integer() and t2.is_integer()
+            and 0 <= age < 128 and 0 <= pulse < 512 and 0 <= t2 < 256):
+        return features
+    flags = int(fever) | int(pallor) << 1 | int(bruises) << 2 | int(weight_loss) << 3
+    return int(age) << 21 | int(pulse) << 12 | int(t2) << 4 | flags
+
+def _unpack_key(key):
+    if isinstance(key, tuple):
+        return key
+    return (
+        float(key >> 21), float(key >> 12 & 0x1FF), float(key & 1),
+        (key >> 4 & 0xFF) / 2, float(key >> 1 & 1), float(key >> 2 & 1), float(key >> 3 & 1),
+    )
+
+@functools.lru_cache(maxsize=4096)
+def _model_prob(key):
+    """Model probability for a _pack_key() key; repeats skip the TF call."""
+    return _shared_cached(
+        f"p:{MODEL_KIND}:{MODEL_TAG}:".encode(), key,
+        lambda: clamp01(INFER(_vectorize(_unpack_key(key)))[0, 0]),
+    )
 
 # --- Flask app setup ---
 app = Flask(__name__, static_folder='.', static_url_path='')
 CORS(app)
 
+def ojsonify(obj, status=200):
+    """Serialize with orjson (handles numpy scalars) instead of flask.jsonify."""
+    return app.response_class(
+        orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY),
+        status=status,
+        mimetype="application/json",
+    )
+
+def _get_json():
+    """Parse the request body with orjson (any content type, like get_json(force=True))."""
+    raw = request.get_data(cache=False)
+    try:
+        data = orjson.loads(raw) if raw else None
+    except orjson.JSONDecodeError:
+        abort(400, description="Request body is not valid JSON.")
+    if data is None:
+        return {}
+    if not isinstance(data, dict):
+        abort(400, description="Request body must be a JSON object.")
+    return data
+
 @app.route('/')
 def root():
     return send_from_directory('.', 'index.html')
 
+# Risk labels by score; a score equal to an edge takes the higher label.
+_GRADE_CUT = 0.5
+_GRADE_EDGES = np.array([_GRADE_CUT])  # for grading whole batches with searchsorted
+_LABELS = np.array(["Low", "High"])
+
+def grade(p):
+    return "High" if p >= _GRADE_CUT else "Low"  # NaN -> "Low", as before
+
+# Response shape; copied per request (copies are thread-safe) and only the varying keys set.
+# Everything else (api version, load errors, contributions) is under "debug" with ?debug=1.
+_RESPONSE = {"risk": "Low", "score": 0.0, "model": None}
+
 @app.route('/predict', methods=['POST'])
 def predict():
-    data = request.get_json(force=True) or {}
+    data = _get_json()
+    debug = request.args.get("debug") == "1"
+    x = parse_features(data)
 
     model = try_load_model()
-    if model is not None:
+    if model is not None and model_ready(data, x):
         try:
-            x = np.array([[
-                float(data.get("age", 8)),
-                float(data.get("pulse", 80)),
-                1.0 if str(data.get("fever", "No")).lower()=="yes" else 0.0,
-                float(data.get("temp_c", 37) or 0),
-                1.0 if str(data.get("pallor", "No")).lower()=="yes" else 0.0,
-                1.0 if str(data.get("bruises", "No")).lower()=="yes" else 0.0,
-                1.0 if str(data.get("weight_loss", "No")).lower()=="yes" else 0.0,
-            ]], dtype="float32")
-
-            prob = float(model.predict(x, verbose=0)[0][0])
-            label = "High" if prob >= 0.5 else "Low"
-            return jsonify({
-                "risk": label,
-                "score": round(prob, 3),
-                "model": "tf-keras",
-                "api": "v1"
-            })
+            features = tuple(np.nan_to_num(x).tolist())
+            prob = _model_prob(_pack_key(features))
+            r = _RESPONSE.copy()
+            r["risk"] = grade(prob)
+            r["score"] = prob
+            r["model"] = MODEL_KIND
+            if debug:
+                r["debug"] = {"api": "v1", "features": dict(zip(_FIELDS, features))}
+            return ojsonify(r)
         except Exception as e:
             print("⚠️ Prediction error:", e)
 
     # fallback
-    prob = fallback_score({
-        "fever": data.get("fever"),
-        "pallor": data.get("pallor"),
-        "bruises": data.get("bruises"),
-        "weight_loss": data.get("weight_loss"),
-        "pulse": data.get("pulse"),
-        "temp_c": data.get("temp_c"),
-    })
-    label = "High" if prob >= 0.5 else "Low"
-    return jsonify({
-        "risk": label,
-        "score": round(prob, 3),
-        "model": "heuristic-fallback",
-        "tf_load_error": MODEL_ERR
+    prob = fallback_score(x)
+    r = _RESPONSE.copy()
+    r["risk"] = grade(prob)
+    r["score"] = prob
+    r["model"] = "heuristic-fallback"
+    if debug:
+        r["debug"] = {"api": "v1", "tf_load_error": MODEL_ERR, "contrib": heuristic_details(x)}
+    return ojsonify(r)
+
+MAX_BATCH = 256  # rows per /predict_batch request
+
+@app.route('/predict_batch', methods=['POST'])
+def predict_batch():
+    data = _get_json()
+    items = data.get("items")
+    if not isinstance(items, list) or not all(isinstance(r, dict) for r in items):
+        return ojsonify({"error": "expected {\"items\": [ {...}, ... ]}"}, status=400)
+    if len(items) > MAX_BATCH:
+        return ojsonify({"error": f"at most {MAX_BATCH} items per request"}, status=413)
+
+    X = np.empty((len(items), len(_FIELDS)), dtype=np.float32)
+    for i, r in enumerate(items):
+        parse_features(r, out=X[i])
+    probs = np.empty(len(items), dtype=np.float32)
+
+    # one forward pass over every row the model can take
+    use_model = np.zeros(len(items), dtype=bool)
+    model = try_load_model()
+    if model is not None and len(items):
+        use_model = np.fromiter(
+            (model_ready(r, X[i]) for i, r in enumerate(items)), dtype=bool, count=len(items))
+        try:
+            if use_model.any():
+                probs[use_model] = np.clip(INFER(np.nan_to_num(X[use_model])).ravel(), 0.0, 1.0)
+        except Exception as e:
+            print("⚠️ Batch prediction error:", e)
+            use_model[:] = False
+
+    rest = ~use_model
+    if rest.any():
+        probs[rest] = score_rows(X[rest])
+
+    return ojsonify({
+        "risks": _LABELS[np.searchsorted(_GRADE_EDGES, probs, side="right")].tolist(),
+        "scores": probs,
+        "models": np.where(use_model, MODEL_KIND, "heuristic-fallback").tolist(),
     })
 
 if __name__ == '__main__':
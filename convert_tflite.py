@@ -0,0 +1,57 @@
+"""Convert leukemia_model.h5 to an int8 TFLite model (run once, needs full TensorFlow).
+
+    python convert_tflite.py
+
+app.py serves leukemia_model.tflite through tflite_runtime when both are available,
+so the server no longer has to import TensorFlow.
+"""
+import numpy as np
+import tensorflow as tf
+
+H5_PATH = "leukemia_model.h5"
+TFLITE_PATH = "leukemia_model.tflite"
+
+def representative_dataset(n=500, seed=0):
+    """Plausible inputs in model order: age, pulse, fever, temp_c, pallor, bruises, weight_loss."""
+    rng = np.random.default_rng(seed)
+    for _ in range(n):
+        flags = rng.integers(0, 2, size=4).astype(np.float32)
+        yield [np.array([[
+            rng.uniform(1, 18),
+            rng.uniform(60, 160),
+            flags[0],
+            rng.uniform(36.0, 41.0),
+            flags[1],
+            flags[2],
+            flags[3],
+        ]], dtype=np.float32)]
+
+def max_abs_diff(model, tflite_model):
+    """Largest |int8 TFLite - Keras| score over the representative set."""
+    itp = tf.lite.Interpreter(model_content=tflite_model)
+    itp.allocate_tensors()
+    in_i = itp.get_input_details()[0]["index"]
+    out_i = itp.get_output_details()[0]["index"]
+    worst = 0.0
+    for (x,) in representative_dataset():
+        itp.set_tensor(in_i, x)
+        itp.invoke()
+        ref = model(x, training=False).numpy()
+        worst = max(worst, float(np.abs(itp.get_tensor(out_i) - ref).max()))
+    return worst
+
+def main():
+    model = tf.keras.models.load_model(H5_PATH, compile=False)
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    converter.representative_dataset = representative_dataset
+    converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+    # keep float32 input/output so app.py feeds the same buffers as for Keras
+    tflite_model = converter.convert()
+    print(f"max |tflite - keras| on the representative set: {max_abs_diff(model, tflite_model):.4f}")
+    with open(TFLITE_PATH, "wb") as f:
+        f.write(tflite_model)
+    print("✅ Wrote", TFLITE_PATH)
+
+if __name__ == "__main__":
+    main()
@@ -17,4 +17,4 @@ else
 fi
 
 echo "🚀 Starting app with gunicorn..."
-exec gunicorn app:app --bind 0.0.0.0: --timeout 120
+exec gunicorn app:app --preload --workers 1 --worker-class gthread --threads 8 --bind 0.0.0.0:${PORT:-10000} --timeout 120